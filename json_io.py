@@ -0,0 +1,45 @@
+"""
+Shared JSON helpers for the scraper and data processor
+Uses orjson when it is installed and falls back to the stdlib json module
+"""
+
+import os
+import json
+import tempfile
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib serializer
+    orjson = None
+
+def dumps_json(data):
+    """Serialize compact JSON to bytes, using orjson when it is installed"""
+    return orjson.dumps(data) if orjson else json.dumps(data).encode()
+
+def loads_json(raw):
+    """Parse JSON from bytes, using orjson when it is installed"""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+def read_json(path):
+    """Read and parse a JSON file"""
+    with open(path, 'rb') as f:
+        return loads_json(f.read())
+
+def write_json_atomic(path, data, indent=True):
+    """Write JSON to a temp file beside path, then rename it into place
+    
+    A crash mid-write leaves the previous file intact instead of a truncated one.
+    Pass indent=False for machine-only files that nobody reads by hand.
+    """
+    if not indent:
+        raw = dumps_json(data)
+    elif orjson:
+        raw = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        raw = json.dumps(data, indent=2).encode()
+    
+    with tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(path), delete=False) as tmp:
+        tmp.write(raw)
+        tmp.flush()
+        os.fsync(tmp.fileno())
+    os.replace(tmp.name, path)
@@ -5,35 +5,34 @@ Processes CSV data and generates JSON files for the dashboard
 """
 
 import os
-import json
 import csv
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from json_io import read_json, write_json_atomic
 
-# File paths
-CONFIG_FILE = "config.json"
-CSV_FILE = "data/solar_export_latest.csv"
-PERSISTENT_TOTALS_FILE = "data/persistent_totals.json"
-SOLAR_DATA_FILE = "solar_data.json"
+# File paths (relative to the repository, not the working directory)
+BASE_DIR = Path(__file__).resolve().parent
+CONFIG_FILE = BASE_DIR / "config.json"
+CSV_FILE = BASE_DIR / "data" / "solar_export_latest.csv"
+PERSISTENT_TOTALS_FILE = BASE_DIR / "data" / "persistent_totals.json"
+SOLAR_DATA_FILE = BASE_DIR / "solar_data.json"
 
 def load_config():
     """Load configuration from config.json"""
-    with open(CONFIG_FILE, 'r') as f:
-        return json.load(f)
+    return read_json(CONFIG_FILE)
 
 def load_persistent_totals(config):
     """Load or initialize persistent totals"""
     if os.path.exists(PERSISTENT_TOTALS_FILE):
         try:
-            with open(PERSISTENT_TOTALS_FILE, 'r') as f:
-                data = json.load(f)
-                print(f"  ✓ Loaded persistent totals")
-                
-                # Ensure daily_history exists
-                if 'daily_history' not in data:
-                    data['daily_history'] = []
-                
-                return data
+            data = read_json(PERSISTENT_TOTALS_FILE)
+            print(f"  ✓ Loaded persistent totals")
+            
+            # Ensure daily_history exists
+            if 'daily_history' not in data:
+                data['daily_history'] = []
+            
+            return data
         except Exception as e:
             print(f"  ⚠ Error loading persistent totals: {e}")
     
@@ -55,8 +54,7 @@ def load_persistent_totals(config):
 
 def save_persistent_totals(totals):
     """Save persistent totals"""
-    with open(PERSISTENT_TOTALS_FILE, 'w') as f:
-        json.dump(totals, f, indent=2)
+    write_json_atomic(PERSISTENT_TOTALS_FILE, totals)
 
 def calc_environmental_impact(kwh, params):
     """Calculate environmental impact metrics"""
@@ -128,7 +126,7 @@ def parse_csv_data(config):
                 try:
                     timestamp = datetime.strptime(timestamp_str, fmt)
                     break
-                except:
+                except ValueError:
                     continue
 
             if not timestamp:
@@ -144,7 +142,7 @@ def parse_csv_data(config):
             
             try:
                 power_w = float(power_str)
-            except:
+            except ValueError:
                 continue
 
             # Only keep today's data with power > 0
@@ -248,8 +246,7 @@ def save_solar_data(data, config):
         "past_7_days": data["past_7_days"]
     }
     
-    with open(SOLAR_DATA_FILE, 'w') as f:
-        json.dump(solar_data, f, indent=2)
+    write_json_atomic(SOLAR_DATA_FILE, solar_data)
     print(f"  ✓ Solar data saved to {SOLAR_DATA_FILE}")
 
 if __name__ == "__main__":
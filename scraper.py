@@ -6,10 +6,19 @@ FIXED VERSION - Detects expired auth by checking page title
 """
 
 import os
-import json
 import base64
+import gzip
+import inspect
+import linecache
+import re
+import shutil
+import signal
+import sys
+import tempfile
 from datetime import datetime
-from playwright.sync_api import sync_playwright
+from urllib.parse import urlparse
+import requests
+from json_io import dumps_json, loads_json, read_json, write_json_atomic
 
 # Get credentials from environment variables (GitHub Secrets)
 SOLAR_EMAIL = os.getenv('SOLAR_EMAIL')
@@ -18,83 +27,513 @@ SOLAR_PASSWORD = os.getenv('SOLAR_PASSWORD')
 if not SOLAR_EMAIL or not SOLAR_PASSWORD:
     raise ValueError("Missing SOLAR_EMAIL or SOLAR_PASSWORD environment variables")
 
+# Exit straight away when the workflow is cancelled instead of riding out page timeouts;
+# SystemExit still runs the finally blocks that close the browser
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
+
+# Resolve paths against the repository rather than the process working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+
 # Configuration
-CSV_DOWNLOAD_PATH = "data/downloads"
-LATEST_CSV_FILE = "data/solar_export_latest.csv"
+CSV_DOWNLOAD_PATH = os.path.join(DATA_DIR, "downloads")
+LATEST_CSV_FILE = os.path.join(DATA_DIR, "solar_export_latest.csv")
+AUTH_STATE_FILE = os.path.join(DATA_DIR, "auth_state_encoded.txt")
+LAST_SCRAPE_FILE = os.path.join(DATA_DIR, "last_scrape.json")
+CSV_ENDPOINT_FILE = os.path.join(DATA_DIR, "csv_endpoint.json")
+# Full desktop Chrome UA - the default one advertises HeadlessChrome
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+PLAYWRIGHT_DOWNLOADS_PATH = os.path.join(DATA_DIR, ".pw-downloads")
+CHROMIUM_PROFILE_DIR = os.path.join(DATA_DIR, ".chromium-profile")
+# Playwright timeouts in ms - raise them through the environment on slow runners
+DEFAULT_TIMEOUT = int(os.getenv('PW_DEFAULT_TIMEOUT', '30000'))
+NAVIGATION_TIMEOUT = int(os.getenv('PW_NAV_TIMEOUT', '60000'))
 
-def run_playwright():
-    """Run Playwright to download CSV data from Genergy portal"""
-    print("🤖 Starting Playwright browser automation...")
+# Chromium flags - strip subsystems the scraper never uses. No --disable-features here:
+# Chromium keeps only the last one, so it would replace Playwright's own list (which
+# already disables Translate and the back/forward cache).
+BROWSER_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--blink-settings=imagesEnabled=false',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--metrics-recording-only',
+    '--mute-audio',
+    '--no-first-run',
+    '--disable-ipc-flooding-protection',
+    # Launch renderers directly instead of forking them from a zygote (needs --no-sandbox)
+    '--no-zygote',
+    # Both portal hosts are trusted, so skip per-site renderer isolation
+    # (site-per-process is a switch, not a feature - this is how it is turned off)
+    '--disable-site-isolation-trials',
+]
+
+# Login (pass.) and portal (genergy.) hosts share this domain
+PORTAL_DOMAIN = "enerest.world"
+# The SPA's host and origin (whose local storage holds the OAuth tokens) and Keycloak's host
+PORTAL_HOST = "genergy.enerest.world"
+PORTAL_ORIGIN = f"https://{PORTAL_HOST}"
+LOGIN_HOST = "pass.enerest.world"
+
+# Portal selectors - built once; comma-joined alternatives resolve in a single DOM query
+EMAIL_SELECTOR = 'input[name="username"], input[type="email"], input[type="text"]'
+PASSWORD_SELECTOR = 'input[type="password"], input[name="password"]'
+LOGIN_BUTTON_SELECTOR = 'button:has-text("Log In"), button[type="submit"], input[type="submit"]'
+SEARCH_SELECTOR = 'sds-global-search'
+SEARCH_FIELD_SELECTOR = '[data-test="global-search-field"]'
+INSIGHTS_SELECTOR = "button:has-text('insights')"
+MENU_TRIGGER_SELECTOR = '[data-test="menu-trigger"]'
+
+# Sets both credentials through the native value setter (so framework listeners see
+# the input events) and submits the form; returns false if the form is not there yet
+SUBMIT_LOGIN_SCRIPT = """([emailSelector, passwordSelector, email, password]) => {
+    const emailField = document.querySelector(emailSelector);
+    const passwordField = document.querySelector(passwordSelector);
+    if (!emailField || !passwordField || !passwordField.form) return false;
+    const setValue = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+    for (const [field, value] of [[emailField, email], [passwordField, password]]) {
+        setValue.call(field, value);
+        field.dispatchEvent(new Event('input', {bubbles: true}));
+        field.dispatchEvent(new Event('change', {bubbles: true}));
+    }
+    passwordField.form.requestSubmit();
+    return true;
+}"""
+
+# Restores the saved local storage (where the portal keeps its OAuth tokens) on the
+# first load of each origin in the tab; later loads keep what the SPA has written since
+SEED_LOCAL_STORAGE_SCRIPT = """(saved => {
+    const items = saved[location.origin];
+    if (!items || sessionStorage.getItem('auth-state-seeded')) return;
+    for (const {name, value} of items) localStorage.setItem(name, value);
+    sessionStorage.setItem('auth-state-seeded', '1');
+})(%s);"""
+
+# Resources the scraper never reads - aborted before they are downloaded
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+BLOCKED_URL_PATTERN = re.compile(r"google-analytics|googletagmanager|segment\.io|hotjar|datadog|sentry|doubleclick")
+
+def block_unused_resources(route):
+    """Abort images, fonts, media and analytics beacons; let everything else through"""
+    request = route.request
+    if 'csv' in request.url.lower():
+        route.continue_()  # Never risk blocking the export itself
+    elif request.resource_type in BLOCKED_RESOURCE_TYPES or BLOCKED_URL_PATTERN.search(request.url):
+        route.abort()
+    else:
+        route.continue_()
+
+def fast_stack(context=1):
+    """inspect.stack() without the per-frame source file and module lookups
+    
+    Context lines come from linecache, which reads each file once per run.
+    """
+    frame = sys._getframe(1)
+    stack = []
+    while frame:
+        filename, lineno = frame.f_code.co_filename, frame.f_lineno
+        code_context = index = None
+        if context > 0:
+            # Same window as inspect.getframeinfo, centred on the current line
+            lines = linecache.getlines(filename, frame.f_globals)
+            if lines:
+                start = max(0, min(lineno - 1 - context // 2, len(lines) - context))
+                code_context = lines[start:start + context]
+                index = lineno - 1 - start
+        stack.append(inspect.FrameInfo(frame, filename, lineno, frame.f_code.co_name,
+                                       code_context, index))
+        frame = frame.f_back
+    return stack
+
+class FastStackInspect:
+    """Stand-in for the inspect module inside Playwright, with a cheap stack()"""
+    stack = staticmethod(fast_stack)
+    
+    def __getattr__(self, name):
+        return getattr(inspect, name)
+
+def use_fast_playwright_stacks():
+    """Make Playwright's per-call caller-stack capture cheap
+    
+    Every sync API call runs inspect.stack(), which resolves source files and
+    modules for each frame - a large share of the scraper's CPU time.
+    """
+    try:
+        from playwright._impl import _connection, _sync_base
+    except ImportError:  # Internal layout changed - keep the default behaviour
+        return
     
-    # Create data directory
-    os.makedirs('data', exist_ok=True)
-    os.makedirs('data/daily', exist_ok=True)
+    for module in (_connection, _sync_base):
+        if getattr(module, 'inspect', None) is inspect:
+            module.inspect = FastStackInspect()
+
+def ensure_data_dirs():
+    """Create the data directories once per run, not on every download
     
+    Only the leaf directories are listed - makedirs creates DATA_DIR (which also
+    holds the latest CSV, scrape info and error screenshots) on the way.
+    """
+    for directory in (os.path.join(DATA_DIR, 'daily'), CSV_DOWNLOAD_PATH, PLAYWRIGHT_DOWNLOADS_PATH):
+        os.makedirs(directory, exist_ok=True)
+
+def load_auth_state():
+    """Load the saved browser storage state, or None if there is none"""
     # Check for saved auth state (SAME AS 1ST AVENUE SPAR)
-    use_auth_state = False
-    auth_state_file = 'data/auth_state_encoded.txt'
+    if not os.path.exists(AUTH_STATE_FILE):
+        print("ℹ️  No saved auth state found, will login normally")
+        return None
     
-    if os.path.exists(auth_state_file):
-        try:
-            print("🔐 Found saved authentication state")
-            
-            # Read and decode the auth state
-            with open(auth_state_file, 'r') as f:
-                encoded = f.read()
+    try:
+        print("🔐 Found saved authentication state")
+        
+        # Read and decode the auth state
+        with open(AUTH_STATE_FILE, 'r') as f:
+            encoded = f.read()
+        
+        raw = base64.b64decode(encoded)
+        
+        # Older saves are plain base64 JSON; newer ones are gzipped first
+        if raw[:2] == b'\x1f\x8b':
+            raw = gzip.decompress(raw)
+        
+        storage_state = loads_json(raw)
+        print("✅ Using saved authentication state from repository")
+        return storage_state
+    except Exception as e:
+        print(f"⚠️  Could not use auth state: {e}")
+        print("   Will login normally")
+        return None
+
+def save_auth_state(context):
+    """Save the browser storage state for the next run, skipping unchanged state
+    
+    Runs with a still-valid session usually produce identical state; leaving the
+    file untouched keeps the data commit from churning.
+    """
+    # gzip shrinks the repetitive cookie JSON several times over; mtime=0 keeps the
+    # output byte-identical for identical state, so the unchanged check still works
+    # Only the portal's own cookies and storage are needed to resume the session
+    storage_state = context.storage_state()
+    storage_state['cookies'] = [c for c in storage_state['cookies'] if c['domain'].endswith(PORTAL_DOMAIN)]
+    storage_state['origins'] = [o for o in storage_state.get('origins', []) if PORTAL_DOMAIN in o.get('origin', '')]
+    
+    raw = gzip.compress(dumps_json(storage_state), compresslevel=6, mtime=0)
+    encoded = base64.b64encode(raw).decode()
+    
+    if os.path.exists(AUTH_STATE_FILE):
+        with open(AUTH_STATE_FILE, 'r') as f:
+            if f.read() == encoded:
+                print("  ↷ Auth state unchanged, skipping save")
+                return
+    
+    print("   💾 Saving authentication state for next run...")
+    with open(AUTH_STATE_FILE, 'w') as f:
+        f.write(encoded)
+    
+    print("  ✓ Authentication state saved")
+    print("     This will skip login on next run!")
+
+def load_csv_endpoint(start_ts):
+    """Load the CSV export URL captured by an earlier browser run"""
+    if not os.path.exists(CSV_ENDPOINT_FILE):
+        return None
+    
+    try:
+        endpoint = read_json(CSV_ENDPOINT_FILE)
+    except Exception as e:
+        print(f"  ⚠ Could not read CSV endpoint: {e}")
+        return None
+    
+    # The export covers a single day - move the captured date to today
+    today = start_ts.strftime('%Y-%m-%d')
+    return endpoint['url'].replace(endpoint['captured_date'], today)
+
+def save_csv_endpoint(url, start_ts):
+    """Remember the CSV export URL so the next run can skip the browser"""
+    endpoint = {
+        "url": url,
+        "captured_date": start_ts.strftime('%Y-%m-%d')
+    }
+    
+    write_json_atomic(CSV_ENDPOINT_FILE, endpoint)
+    print(f"  ✓ CSV endpoint saved for direct download")
+
+def save_dated_copy(start_ts):
+    """Keep a dated copy of the latest CSV, hard-linked instead of copied where possible
+    
+    The latest CSV is only ever replaced by rename, so the link never sees later data.
+    """
+    dated_filepath = os.path.join(CSV_DOWNLOAD_PATH, f"solar_data_{start_ts.strftime('%Y%m%d_%H%M%S')}.csv")
+    try:
+        os.link(LATEST_CSV_FILE, dated_filepath)
+    except OSError:
+        shutil.copy2(LATEST_CSV_FILE, dated_filepath)
+    print(f"  ✓ Dated copy saved: {dated_filepath}")
+
+def saved_access_token(storage_state, start_ts):
+    """Return the portal's OAuth access token from saved local storage, or None if expired
+    
+    The portal keeps its session in local storage rather than cookies, so its API
+    expects the token as a Bearer header.
+    """
+    for origin in (storage_state or {}).get('origins', []):
+        if origin.get('origin') != PORTAL_ORIGIN:
+            continue
+        items = {item['name']: item['value'] for item in origin.get('localStorage', [])}
+        token = items.get('access_token')
+        # expires_at is in milliseconds since the epoch
+        expires_at = int(items.get('expires_at') or 0)
+        if token and expires_at > start_ts.timestamp() * 1000:
+            return token
+    return None
+
+def fetch_csv_http(storage_state, start_ts):
+    """Download the CSV over plain HTTP with the saved session
+    
+    Returns (csv_path, session_rejected). csv_path is None when the browser flow
+    is needed; session_rejected says the portal refused the saved token, which
+    is a cheaper auth probe than loading the SPA to find out.
+    """
+    csv_url = load_csv_endpoint(start_ts)
+    access_token = saved_access_token(storage_state, start_ts)
+    if not access_token or not csv_url:
+        return None, False
+    
+    print("⚡ Trying direct CSV download (no browser)...")
+    session = requests.Session()
+    session.headers.update({'User-Agent': USER_AGENT, 'Accept': 'text/csv, */*',
+                            'Authorization': f'Bearer {access_token}'})
+    for cookie in storage_state.get('cookies', []):
+        session.cookies.set(cookie['name'], cookie['value'],
+                            domain=cookie['domain'], path=cookie.get('path', '/'))
+    
+    # Stream straight to disk; the temp file only replaces the CSV once complete
+    tmp = tempfile.NamedTemporaryFile('wb', dir=os.path.dirname(LATEST_CSV_FILE), delete=False)
+    try:
+        with tmp, session.get(csv_url, stream=True, timeout=30) as response:
+            if response.status_code in (401, 403):
+                print(f"  ⚠ Saved session rejected (HTTP {response.status_code})")
+                return None, True
+            if response.status_code != 200:
+                print(f"  ⚠ Direct download returned HTTP {response.status_code}")
+                return None, False
             
-            auth_data = base64.b64decode(encoded).decode()
+            # iter_content (unlike response.raw) wraps mid-stream failures in RequestException
+            chunks = response.iter_content(chunk_size=64 * 1024)
             
-            # Save to temp file
-            with open('auth_state_temp.json', 'w') as f:
-                f.write(auth_data)
+            # The first rows carry the date - reject login pages and stale exports early
+            head = b''
+            for chunk in chunks:
+                head += chunk
+                if len(head) >= 1024:
+                    break
+            if start_ts.strftime('%m/%d/%Y').encode() not in head[:1024]:
+                print("  ⚠ Direct download did not contain today's data")
+                return None, False
             
-            use_auth_state = True
-            print("✅ Using saved authentication state from repository")
-        except Exception as e:
-            print(f"⚠️  Could not use auth state: {e}")
-            print("   Will login normally")
-    else:
-        print("ℹ️  No saved auth state found, will login normally")
+            tmp.write(head)
+            for chunk in chunks:
+                tmp.write(chunk)
+        os.replace(tmp.name, LATEST_CSV_FILE)
+    except requests.RequestException as e:
+        print(f"  ⚠ Direct download failed: {e}")
+        return None, False
+    finally:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+    
+    print(f"  ✓ CSV downloaded: {LATEST_CSV_FILE}")
+    save_dated_copy(start_ts)
+    
+    return LATEST_CSV_FILE, False
+
+def fetch_csv_via_context(context, start_ts):
+    """Fetch the captured export URL with the browser session, skipping the UI
+    
+    Returns True when the CSV was saved.
+    """
+    csv_url = load_csv_endpoint(start_ts)
+    if not csv_url:
+        return False
+    
+    # context.request shares the cookie jar but not local storage, where the SPA keeps
+    # its (possibly just refreshed) access token
+    access_token = saved_access_token(context.storage_state(), start_ts)
+    if not access_token:
+        return False
+    
+    from playwright.sync_api import Error as PlaywrightError
+    
+    print("   Fetching CSV with the browser session...")
+    try:
+        response = context.request.get(csv_url, headers={'Authorization': f'Bearer {access_token}'},
+                                       timeout=DEFAULT_TIMEOUT)
+    except PlaywrightError as e:
+        print(f"  ⚠ Direct fetch failed: {e}")
+        return False
+    
+    if not response.ok:
+        print(f"  ⚠ Direct fetch returned HTTP {response.status}, using the export menu")
+        return False
+    
+    body = response.body()
+    if start_ts.strftime('%m/%d/%Y').encode() not in body[:1024]:
+        print("  ⚠ Direct fetch did not contain today's data, using the export menu")
+        return False
+    
+    partial_path = LATEST_CSV_FILE + '.part'
+    with open(partial_path, 'wb') as f:
+        f.write(body)
+    os.replace(partial_path, LATEST_CSV_FILE)
+    
+    print(f"  ✓ CSV downloaded: {LATEST_CSV_FILE}")
+    save_dated_copy(start_ts)
+    return True
+
+def download_csv_via_menu(page, start_ts):
+    """Search for Muir College, open its insights and download the CSV from the export menu"""
+    # Navigate to Muir College
+    print("   Searching for Muir College...")
+    
+    try:
+        # Locator actions auto-wait for visibility, so each step is a single round trip
+        print("   → Clicking search component...")
+        page.locator(SEARCH_SELECTOR).click()
+        
+        print("   → Filling search field with 'Muir'...")
+        page.locator(SEARCH_FIELD_SELECTOR).fill("Muir")
+        
+        print("   → Clicking insights button...")
+        search_url = page.url
+        page.locator(INSIGHTS_SELECTOR).first.click()
+        
+        # The SPA routes to the insights page - wait for that instead of sleeping
+        page.wait_for_url(lambda url: url != search_url)
+        
+        print("  ✓ Successfully navigated to Muir College insights")
+        
+    except Exception as e:
+        print(f"  ✗ Navigation failed: {e}")
+        raise Exception(f"Failed to navigate to Muir College: {e}")
+    
+    # The export menu only renders once the insights page is loaded
+    print("   Downloading CSV...")
+    page.locator(MENU_TRIGGER_SELECTOR).click()
+    print("  ✓ Muir College insights loaded")
+    
+    print("   Waiting for CSV download...")
+    
+    # Remember where the export comes from so the next run can fetch it directly
+    export_urls = []
+    page.on("response", lambda response: export_urls.append(response.url)
+            if 'csv' in response.headers.get('content-type', '') else None)
+    
+    with page.expect_download() as download_info:
+        page.get_by_role("menuitem", name="CSV").click()
+    
+    download = download_info.value
+    
+    # Playwright's downloads directory is under data/, so its finished file can be
+    # renamed into place with no copy at all. A rename (never an in-place write) also
+    # leaves the previous run's hard-linked dated copy untouched.
+    try:
+        os.replace(download.path(), LATEST_CSV_FILE)
+    except OSError:
+        # Different filesystem - copy once beside the target and rename it in
+        partial_path = LATEST_CSV_FILE + '.part'
+        shutil.copyfile(download.path(), partial_path)
+        os.replace(partial_path, LATEST_CSV_FILE)
+        # Release Playwright's copy now rather than at context close
+        download.delete()
+    
+    print(f"  ✓ CSV downloaded: {LATEST_CSV_FILE}")
+    save_dated_copy(start_ts)
+    
+    # Blob downloads are built in the page, so fall back to the sniffed response
+    if download.url.startswith('http'):
+        save_csv_endpoint(download.url, start_ts)
+    elif export_urls:
+        save_csv_endpoint(export_urls[-1], start_ts)
+
+def run_playwright(storage_state, start_ts, session_rejected=False):
+    """Run Playwright to download CSV data from Genergy portal"""
+    print("🤖 Starting Playwright browser automation...")
+    
+    # A profile restored from the Actions cache may already hold a live session
+    profile_exists = os.path.isdir(CHROMIUM_PROFILE_DIR) and bool(os.listdir(CHROMIUM_PROFILE_DIR))
+    use_auth_state = storage_state is not None or profile_exists
+    
+    # The portal refused the saved access token - skip loading the SPA just to see the login
+    # redirect. The saved state is still seeded: Keycloak's own session may outlive the token.
+    if session_rejected:
+        print("  ↳ Saved access token rejected, going straight to login")
+        use_auth_state = False
+    
+    # Lock files from the machine that saved the profile would block the launch
+    for lock_name in ('SingletonLock', 'SingletonCookie', 'SingletonSocket'):
+        lock_path = os.path.join(CHROMIUM_PROFILE_DIR, lock_name)
+        if os.path.lexists(lock_path):
+            os.remove(lock_path)
+    
+    # Playwright is only loaded when the HTTP fast path could not get the CSV
+    from playwright.sync_api import sync_playwright, Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError
+    
+    if os.getenv('PW_INSPECT_STACK') == '0':
+        use_fast_playwright_stacks()
     
     with sync_playwright() as p:
         print("   Launching Chromium browser...")
         
-        browser = p.chromium.launch(
+        # Persistent profile keeps cookies, local storage and HTTP cache between runs
+        context = p.chromium.launch_persistent_context(
+            CHROMIUM_PROFILE_DIR,
             headless=True,
-            args=[
-                '--no-sandbox',
-                '--disable-setuid-sandbox',
-                '--disable-blink-features=AutomationControlled',
-            ]
+            args=BROWSER_ARGS,
+            downloads_path=PLAYWRIGHT_DOWNLOADS_PATH,
+            accept_downloads=True,
+            user_agent=USER_AGENT,
+            viewport={'width': 1920, 'height': 1080},
+            locale='en-US',
         )
         
-        # Create context with or without saved state
-        if use_auth_state and os.path.exists('auth_state_temp.json'):
+        # The committed auth state outlives the cache and is saved fresh every run, so it
+        # seeds the cookies and, ahead of any page script, the portal's local storage
+        if storage_state:
+            context.add_cookies(storage_state.get('cookies', []))
+            saved_origins = {origin['origin']: origin.get('localStorage', [])
+                             for origin in storage_state.get('origins', [])}
+            context.add_init_script(SEED_LOCAL_STORAGE_SCRIPT % dumps_json(saved_origins).decode())
             print("  ✓ Loaded auth state from file (skipping login)")
-            context = browser.new_context(
-                storage_state='auth_state_temp.json',
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                viewport={'width': 1920, 'height': 1080},
-            )
-        else:
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-                viewport={'width': 1920, 'height': 1080},
-            )
+        elif use_auth_state:
+            print("  ✓ Using cached browser profile (skipping login)")
+        
+        # Set once here rather than on every locator call below
+        context.set_default_timeout(DEFAULT_TIMEOUT)
+        context.set_default_navigation_timeout(NAVIGATION_TIMEOUT)
         
-        page = context.new_page()
+        context.route("**/*", block_unused_resources)
+        page = context.pages[0] if context.pages else context.new_page()
         
         try:
             if use_auth_state:
                 # Try to navigate directly to monitoring page
                 print("   Navigating to monitoring page...")
-                page.goto("https://genergy.enerest.world/monitoring", 
-                         wait_until="domcontentloaded", 
-                         timeout=60000)
+                page.goto("https://genergy.enerest.world/monitoring", wait_until="domcontentloaded")
+                
+                # Wait until the SPA either renders the portal or bounces to the login form
+                try:
+                    page.locator(f"{SEARCH_SELECTOR}, {PASSWORD_SELECTOR}").first.wait_for(state="visible")
+                except PlaywrightTimeoutError:
+                    print("  ⚠ Neither portal nor login form rendered, checking URL and title")
                 
                 # Check if we're actually logged in - CHECK BOTH URL AND PAGE TITLE!
-                import time
-                time.sleep(3)
                 current_url = page.url
                 page_title = page.title()
                 
@@ -116,210 +555,57 @@ def run_playwright():
             if not use_auth_state:
                 # Normal login process - ULTRA ROBUST VERSION
                 print("   Navigating to login page...")
+                # Tokens the SPA stores from here on come from this login
+                login_started_ms = int(datetime.now().timestamp() * 1000)
                 page.goto("https://pass.enerest.world/auth/realms/pass/protocol/openid-connect/auth?response_type=code&client_id=1d699ca7-87c8-4d6d-98dc-32a4cc316907&state=S01PQVY4dnJ3cUdfY3l-YkRWbDZtRmNwY05PQ3BfcEZYclRqUnlIemN1ZXZq&redirect_uri=https%3A%2F%2Fgenergy.enerest.world%2Findex.html&scope=openid%20profile&code_challenge=66CPKTUs7xUuUNmX1CvSRmQXO8ZllglERBHknop_ikg&code_challenge_method=S256&nonce=S01PQVY4dnJ3cUdfY3l-YkRWbDZtRmNwY09PQ3BfcEZYclRqUnlIemN1ZXZq&responseMode=query", 
-                         wait_until="networkidle",
-                         timeout=60000)
+                         wait_until="domcontentloaded")
                 
-                import time
-                print("   Waiting for login page to fully render...")
-                time.sleep(5)
-                
-                # Verify we're on the login page
+                # A live Keycloak session (from the profile or saved cookies) skips the form and
+                # redirects straight back to the portal with a fresh authorization code.
+                # Compare hosts - the login URL's redirect_uri also names the portal.
                 print(f"   Current URL: {page.url}")
-                if "pass.enerest.world" not in page.url:
+                current_host = urlparse(page.url).hostname
+                if current_host == PORTAL_HOST:
+                    print("  ✓ Keycloak session still valid, no credentials needed")
+                elif current_host != LOGIN_HOST:
                     raise Exception("Failed to reach login page")
-                
-                # Fill in credentials
-                print("   Filling in email...")
-                try:
-                    page.wait_for_selector('input[type="text"], input[name="username"]', 
-                                          state="visible", timeout=20000)
-                    time.sleep(1)
+                else:
+                    # Fill in credentials and submit in one evaluate call; the login page is
+                    # server-rendered, so the form is normally there once goto returns
+                    print("   Submitting credentials...")
                     
-                    page.get_by_role("textbox", name="Email").click(timeout=10000)
-                    page.get_by_role("textbox", name="Email").fill(SOLAR_EMAIL)
-                    print("  ✓ Email filled using role selector")
-                except Exception as e:
-                    print(f"  ⚠ Role selector failed: {str(e)[:100]}")
-                    print("  ↳ Trying fallback...")
-                    email_input = page.locator('input[type="text"], input[name="username"]').first
-                    email_input.wait_for(state="visible", timeout=10000)
-                    email_input.fill(SOLAR_EMAIL)
-                    print("  ✓ Email filled using fallback")
-                
-                time.sleep(1)
-                
-                print("   Filling in password...")
-                try:
-                    page.get_by_role("textbox", name="Password").click(timeout=10000)
-                    page.get_by_role("textbox", name="Password").fill(SOLAR_PASSWORD)
-                    print("  ✓ Password filled using role selector")
-                except Exception as e:
-                    print(f"  ⚠ Role selector failed: {str(e)[:100]}")
-                    print("  ↳ Trying fallback...")
-                    password_input = page.locator('input[type="password"], input[name="password"]').first
-                    password_input.wait_for(state="visible", timeout=10000)
-                    password_input.fill(SOLAR_PASSWORD)
-                    print("  ✓ Password filled using fallback")
-                
-                time.sleep(2)
-                
-                # Click login button - try multiple strategies
-                print("   Clicking login button...")
-                login_clicked = False
+                    # Wait for the redirect back to the portal instead of a fixed sleep
+                    with page.expect_navigation(url=lambda url: urlparse(url).hostname == PORTAL_HOST,
+                                                wait_until="domcontentloaded"):
+                        if not page.evaluate(SUBMIT_LOGIN_SCRIPT, [EMAIL_SELECTOR, PASSWORD_SELECTOR,
+                                                                   SOLAR_EMAIL, SOLAR_PASSWORD]):
+                            # Form not rendered yet - fall back to the auto-waiting locators
+                            print("  ⚠ Login form not ready, filling field by field")
+                            page.locator(EMAIL_SELECTOR).first.fill(SOLAR_EMAIL)
+                            page.locator(PASSWORD_SELECTOR).first.fill(SOLAR_PASSWORD)
+                            page.locator(LOGIN_BUTTON_SELECTOR).first.click()
+                    print("  ✓ Login completed")
                 
-                # Strategy 1: Role selector
-                if not login_clicked:
-                    try:
-                        print("   → Strategy 1: Role selector...")
-                        login_button = page.get_by_role("button", name="Log In")
-                        login_button.wait_for(state="visible", timeout=5000)
-                        login_button.click(timeout=3000)
-                        print("  ✓ Login button clicked using role selector")
-                        login_clicked = True
-                    except Exception as e:
-                        print(f"  ⚠ Strategy 1 failed: {str(e)[:80]}")
-                
-                # Strategy 2: Submit button
-                if not login_clicked:
-                    try:
-                        print("   → Strategy 2: Submit button...")
-                        submit_btn = page.locator('button[type="submit"]').first
-                        submit_btn.wait_for(state="visible", timeout=5000)
-                        submit_btn.click(timeout=3000)
-                        print("  ✓ Login button clicked using submit selector")
-                        login_clicked = True
-                    except Exception as e:
-                        print(f"  ⚠ Strategy 2 failed: {str(e)[:80]}")
-                
-                # Strategy 3: Any button with "Log" text
-                if not login_clicked:
-                    try:
-                        print("   → Strategy 3: Button with 'Log' text...")
-                        log_btn = page.locator('button:has-text("Log")').first
-                        log_btn.wait_for(state="visible", timeout=5000)
-                        log_btn.click(timeout=3000)
-                        print("  ✓ Login button clicked using text selector")
-                        login_clicked = True
-                    except Exception as e:
-                        print(f"  ⚠ Strategy 3 failed: {str(e)[:80]}")
-                
-                # Strategy 4: Press Enter key on password field
-                if not login_clicked:
-                    try:
-                        print("   → Strategy 4: Press Enter key...")
-                        password_field = page.locator('input[type="password"]').first
-                        password_field.press("Enter")
-                        print("  ✓ Submitted form using Enter key")
-                        login_clicked = True
-                    except Exception as e:
-                        print(f"  ⚠ Strategy 4 failed: {str(e)[:80]}")
-                
-                if not login_clicked:
-                    raise Exception("Could not click login button with any strategy")
-                
-                print("   Waiting for login to complete...")
-                time.sleep(8)
+                # index.html?code=... has parsed, but the SPA still has to swap the code for
+                # tokens - leaving before it has stored them would abort the exchange
+                page.wait_for_function(
+                    "since => Number(localStorage.getItem('access_token_stored_at')) >= since",
+                    arg=login_started_ms)
                 
                 # Navigate to monitoring after login
                 print("   Navigating to monitoring page...")
-                page.goto("https://genergy.enerest.world/monitoring", 
-                         wait_until="domcontentloaded", 
-                         timeout=60000)
-                
-                time.sleep(5)
-            
-            # Now we're on the monitoring page
-            print("   Waiting for page to fully render...")
-            page.wait_for_load_state("domcontentloaded", timeout=30000)
+                page.goto("https://genergy.enerest.world/monitoring", wait_until="domcontentloaded")
             
-            import time
-            time.sleep(5)
-            
-            # Navigate to Muir College
-            print("   Searching for Muir College...")
+            # With a live session the export can be fetched straight through the
+            # context with the SPA's access token; the search and export menus are the fallback
+            if not fetch_csv_via_context(context, start_ts):
+                download_csv_via_menu(page, start_ts)
             
+            # Save the current auth state for next time (SAME AS 1ST AVENUE SPAR)
             try:
-                print("   → Waiting for search component to be visible...")
-                page.wait_for_selector("sds-global-search", state="visible", timeout=30000)
-                time.sleep(2)
-                
-                print("   → Clicking search component...")
-                page.locator("sds-global-search").click()
-                time.sleep(1)
-                
-                print("   → Waiting for search field to be visible...")
-                page.wait_for_selector("[data-test=\"global-search-field\"]", state="visible", timeout=10000)
-                
-                print("   → Filling search field with 'Muir'...")
-                page.locator("[data-test=\"global-search-field\"]").fill("Muir")
-                time.sleep(2)
-                
-                print("   → Waiting for insights button to appear...")
-                page.wait_for_selector("button:has-text('insights')", state="visible", timeout=10000)
-                
-                print("   → Clicking insights button...")
-                page.get_by_role("button").filter(has_text="insights").click()
-                time.sleep(5)
-                
-                print("  ✓ Successfully navigated to Muir College insights")
-                
+                save_auth_state(context)
             except Exception as e:
-                print(f"  ✗ Navigation failed: {e}")
-                raise Exception(f"Failed to navigate to Muir College: {e}")
-            
-            # Wait for insights page to settle
-            print("   Waiting for insights page to fully load...")
-            try:
-                page.wait_for_load_state("networkidle", timeout=10000)
-            except:
-                print("  ⚠ Network still active (normal for SPAs), continuing...")
-            
-            time.sleep(3)
-            print("  ✓ Muir College insights loaded")
-            
-            # Download CSV
-            print("   Downloading CSV...")
-            page.wait_for_selector("[data-test=\"menu-trigger\"]", state="visible", timeout=10000)
-            page.locator("[data-test=\"menu-trigger\"]").click(timeout=5000)
-            time.sleep(2)
-            
-            print("   Waiting for CSV download...")
-            page.wait_for_selector("[role=\"menuitem\"]:has-text('CSV')", state="visible", timeout=10000)
-            
-            with page.expect_download(timeout=30000) as download_info:
-                page.get_by_role("menuitem", name="CSV").click(timeout=5000)
-            
-            download = download_info.value
-            
-            # Save the downloaded file
-            os.makedirs(os.path.dirname(LATEST_CSV_FILE), exist_ok=True)
-            download.save_as(LATEST_CSV_FILE)
-            
-            print(f"  ✓ CSV downloaded: {LATEST_CSV_FILE}")
-            
-            # Also save a dated copy
-            os.makedirs(CSV_DOWNLOAD_PATH, exist_ok=True)
-            dated_filepath = os.path.join(CSV_DOWNLOAD_PATH, f"solar_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
-            download.save_as(dated_filepath)
-            print(f"  ✓ Dated copy saved: {dated_filepath}")
-            
-            # Save the current auth state for next time (SAME AS 1ST AVENUE SPAR)
-            if not use_auth_state:
-                try:
-                    print("   💾 Saving authentication state for next run...")
-                    
-                    # Save as encoded text file
-                    auth_json = context.storage_state()
-                    encoded = base64.b64encode(json.dumps(auth_json).encode()).decode()
-                    
-                    with open('data/auth_state_encoded.txt', 'w') as f:
-                        f.write(encoded)
-                    
-                    print("  ✓ Authentication state saved")
-                    print("     This will skip login on next run!")
-                except Exception as e:
-                    print(f"  ⚠️  Could not save auth state: {e}")
+                print(f"  ⚠️  Could not save auth state: {e}")
             
             return LATEST_CSV_FILE
             
@@ -328,37 +614,29 @@ def run_playwright():
             
             # Take screenshot for debugging
             try:
-                screenshot_path = f"data/error_screenshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+                screenshot_path = os.path.join(DATA_DIR, f"error_screenshot_{start_ts.strftime('%Y%m%d_%H%M%S')}.png")
                 page.screenshot(path=screenshot_path, full_page=True)
                 print(f"   Screenshot saved: {screenshot_path}")
-            except:
-                pass
+            except PlaywrightError as screenshot_error:
+                print(f"   Could not save screenshot: {screenshot_error}")
             
             raise Exception(f"Failed to scrape: {e}")
             
         finally:
-            # Cleanup temp file
-            if os.path.exists('auth_state_temp.json'):
-                os.remove('auth_state_temp.json')
-            
-            import time
-            time.sleep(2)
             context.close()
-            browser.close()
             print("   Browser closed")
 
 
-def save_scrape_info(filepath):
+def save_scrape_info(filepath, start_ts):
     """Save information about the last successful scrape"""
     scrape_info = {
-        "timestamp": datetime.now().isoformat(),
-        "csv_file": filepath,
+        "timestamp": start_ts.isoformat(),
+        "csv_file": os.path.relpath(filepath, BASE_DIR),
         "success": True
     }
     
-    with open("data/last_scrape.json", 'w') as f:
-        json.dump(scrape_info, f, indent=2)
-    
+    # Only read back by tooling, so keep it on one line
+    write_json_atomic(LAST_SCRAPE_FILE, scrape_info, indent=False)
     print(f"  ✓ Scrape info saved")
 
 if __name__ == "__main__":
@@ -367,8 +645,14 @@ if __name__ == "__main__":
     print("=" * 60)
     
     try:
-        csv_file = run_playwright()
-        save_scrape_info(csv_file)
+        # One clock read per run keeps CSV, screenshot and scrape-info names consistent
+        start_ts = datetime.now()
+        ensure_data_dirs()
+        storage_state = load_auth_state()
+        csv_file, session_rejected = fetch_csv_http(storage_state, start_ts)
+        if not csv_file:
+            csv_file = run_playwright(storage_state, start_ts, session_rejected)
+        save_scrape_info(csv_file, start_ts)
         print("\n✅ Scraper completed successfully!")
         print("=" * 60)
         